@@ -18,6 +18,7 @@ from Orange.widgets.widget import Output, Msg
 
 MAX_DL_LIMIT = 1000000
 MAX_TABLES = 1000
+ERROR_STYLE = "QLineEdit {border: 2px solid red;}"
 
 
 def is_postgres(backend):
@@ -26,17 +27,15 @@ def is_postgres(backend):
 
 class TableModel(PyListModel):
     def data(self, index, role=Qt.DisplayRole):
-        row = index.row()
         if role == Qt.DisplayRole:
-            return str(self[row])
+            return str(self[index.row()])
         return super().data(index, role)
 
 
 class BackendModel(PyListModel):
     def data(self, index, role=Qt.DisplayRole):
-        row = index.row()
         if role == Qt.DisplayRole:
-            return self[row].display_name
+            return self[index.row()].display_name
         return super().data(index, role)
 
 
@@ -81,6 +80,11 @@ class OWSql(OWBaseSql):
         self.tabletext = None
         self.sqltext = None
         self.custom_sql = None
+        # (connection and query key, SqlTable, its uninspected domain,
+        # (inspected domain, sampled) or None) of the last opened table
+        self._cached_table = None
+        # whether server, username and database fields are highlighted
+        self._highlighted = (False, False, False)
         super().__init__()
 
     def _setup_gui(self):
@@ -94,7 +98,7 @@ class OWSql(OWBaseSql):
         self.backendcombo = QComboBox(box)
         if self.backends:
             self.backendcombo.setModel(self.backends)
-            names = [backend.display_name for backend in self.backends]
+            names = {backend.display_name for backend in self.backends}
             if self.selected_backend and self.selected_backend in names:
                 self.backendcombo.setCurrentText(self.selected_backend)
         else:
@@ -145,7 +149,7 @@ class OWSql(OWBaseSql):
         le = gui.lineEdit(mt, self, 'materialize_table_name')
         le.setToolTip('Save results of the query in a table')
 
-        gui.button(self.custom_sql, self, 'Execute', callback=self.open_table)
+        gui.button(self.custom_sql, self, 'Execute', callback=self.__on_execute)
 
         form.addWidget(radio_table, 1, 0, Qt.AlignLeft)
         form.addWidget(self.tablecombo, 1, 1)
@@ -160,16 +164,25 @@ class OWSql(OWBaseSql):
         self.custom_sql.setVisible(self.data_source == self.CUSTOM_SQL)
         self.select_table()
 
+    def __on_execute(self):
+        self._invalidate_cache()
+        self.open_table()
+
     def highlight_error(self, text=""):
-        err = ['', 'QLineEdit {border: 2px solid red;}']
-        self.servertext.setStyleSheet(err['server' in text or 'host' in text])
-        self.usernametext.setStyleSheet(err['role' in text])
-        self.databasetext.setStyleSheet(err['database' in text])
+        highlighted = ('server' in text or 'host' in text,
+                       'role' in text,
+                       'database' in text)
+        edits = (self.servertext, self.usernametext, self.databasetext)
+        for edit, new, old in zip(edits, highlighted, self._highlighted):
+            if new != old:
+                edit.setStyleSheet(ERROR_STYLE if new else "")
+        self._highlighted = highlighted
 
     def get_backend(self):
-        if self.backendcombo.currentIndex() < 0:
+        index = self.backendcombo.currentIndex()
+        if index < 0:
             return None
-        return self.backends[self.backendcombo.currentIndex()]
+        return self.backends[index]
 
     def on_connection_success(self):
         super().on_connection_success()
@@ -180,32 +193,42 @@ class OWSql(OWBaseSql):
         super().on_connection_error(err)
         self.highlight_error(str(err).split("\n")[0])
 
+    def _invalidate_cache(self):
+        # Opened tables and their inspected domains are reused only when the
+        # checkbox reopens them; selecting or executing reads them again
+        self._cached_table = None
+
     def clear(self):
         super().clear()
+        self._invalidate_cache()
         self.highlight_error()
         self.tablecombo.clear()
         self.tablecombo.repaint()
 
     def refresh_tables(self):
-        self.tables.clear()
         if self.backend is None:
+            self.tables.clear()
             self.data_desc_table = None
             return
 
-        self.tables.append("Select a table")
         if self.backend.n_tables(self.schema) <= MAX_TABLES:
-            self.tables.extend(self.backend.list_tables(self.schema))
-            index = self.tablecombo.findText(str(self.table))
-            self.tablecombo.setCurrentIndex(index if index != -1 else 0)
+            tables = ["Select a table", *self.backend.list_tables(self.schema)]
+            self.tables[:] = tables
+            table = str(self.table)
+            index = next((i for i, t in enumerate(tables) if str(t) == table),
+                         0)
+            self.tablecombo.setCurrentIndex(index)
             self.tablecombo.setVisible(True)
             self.tabletext.setVisible(False)
         else:
+            self.tables[:] = ["Select a table"]
             self.tablecombo.setVisible(False)
             self.tabletext.setVisible(True)
         self.tablecombo.repaint()
 
     # Called on tablecombo selection change:
     def select_table(self):
+        self._invalidate_cache()
         if self.data_source == self.TABLE:
             return self.open_table()
         else:
@@ -243,38 +266,54 @@ class OWSql(OWBaseSql):
                     self.Error.connection(
                         "Specify a table name to materialize the query")
                     return None
+                name = self.materialize_table_name
+                queries = ["DROP TABLE IF EXISTS " + name,
+                           "CREATE TABLE " + name + " AS " + self.sql,
+                           "ANALYZE " + name]
+                if is_postgres(self.backend):
+                    # psycopg2 runs a multi-statement script in one round trip;
+                    # a newline before ';' ends a trailing -- comment in the
+                    # user's query
+                    queries = ["\n;\n".join(queries)]
                 try:
-                    with self.backend.execute_sql_query("DROP TABLE IF EXISTS " +
-                                                        self.materialize_table_name):
-                        pass
-                    with self.backend.execute_sql_query("CREATE TABLE " +
-                                                        self.materialize_table_name +
-                                                        " AS " + self.sql):
-                        pass
-                    with self.backend.execute_sql_query("ANALYZE " + self.materialize_table_name):
-                        pass
+                    for query in queries:
+                        with self.backend.execute_sql_query(query):
+                            pass
                 except BackendError as ex:
                     self.Error.connection(str(ex))
                     return None
 
-        try:
-            table = SqlTable(dict(host=self.host,
-                                  port=self.port,
-                                  database=self.database,
-                                  user=self.username,
-                                  password=self.password),
-                             what,
-                             backend=type(self.backend),
-                             inspect_values=False)
-        except BackendError as ex:
-            self.Error.connection(str(ex))
-            return None
+        key = (self.host, self.port, self.database, self.username, what,
+               type(self.backend))
+        if self._cached_table is None or self._cached_table[0] != key:
+            try:
+                table = SqlTable(dict(host=self.host,
+                                      port=self.port,
+                                      database=self.database,
+                                      user=self.username,
+                                      password=self.password),
+                                 what,
+                                 backend=type(self.backend),
+                                 inspect_values=False)
+            except BackendError as ex:
+                self.Error.connection(str(ex))
+                return None
+            self._cached_table = key, table, table.domain, None
+        else:
+            # Reuse the connection, fields and row count of the same table or
+            # query, but not the domain inspected for the previous download
+            _, table, domain, _ = self._cached_table
+            table.domain = domain
+        return self._download_table(table)
 
+    def _download_table(self, table):
         self.Error.connection.clear()
 
         sample = False
+        n_rows = len(table)
+        inspected = self._cached_table[3]
 
-        if len(table) > LARGE_TABLE and self.guess_values:
+        if inspected is None and n_rows > LARGE_TABLE and self.guess_values:
             confirm = QMessageBox(self)
             confirm.setIcon(QMessageBox.Warning)
             confirm.setText("Attribute discovery might take "
@@ -294,26 +333,34 @@ class OWSql(OWBaseSql):
 
         self.Information.clear()
         if self.guess_values:
-            QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
+            if inspected is not None:
+                domain, sample = inspected
+            else:
+                QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
+                try:
+                    if sample:
+                        s = table.sample_time(1)
+                        domain = s.get_domain(inspect_values=True)
+                    else:
+                        domain = table.get_domain(inspect_values=True)
+                finally:
+                    QApplication.restoreOverrideCursor()
+                key, _, base_domain, _ = self._cached_table
+                self._cached_table = key, table, base_domain, (domain, sample)
             if sample:
-                s = table.sample_time(1)
-                domain = s.get_domain(inspect_values=True)
                 self.Information.data_sampled()
-            else:
-                domain = table.get_domain(inspect_values=True)
-            QApplication.restoreOverrideCursor()
             table.domain = domain
 
-        if len(table) > AUTO_DL_LIMIT:
+        if n_rows > AUTO_DL_LIMIT:
             if is_postgres(self.backend):
                 confirm = QMessageBox(self)
                 confirm.setIcon(QMessageBox.Warning)
                 confirm.setText("Data appears to be big. Do you really "
                                 "want to download it to local memory?\n"
                                 "Table length: {:,}. Limit {:,}".format(
-                    len(table), MAX_DL_LIMIT))
+                    n_rows, MAX_DL_LIMIT))
 
-                if len(table) <= MAX_DL_LIMIT:
+                if n_rows <= MAX_DL_LIMIT:
                     confirm.addButton("Yes", QMessageBox.YesRole)
                 no_button = confirm.addButton("No", QMessageBox.NoRole)
                 sample_button = confirm.addButton("Yes, a sample",
@@ -323,13 +370,13 @@ class OWSql(OWBaseSql):
                     return None
                 elif confirm.clickedButton() == sample_button:
                     table = table.sample_percentage(
-                        AUTO_DL_LIMIT / len(table) * 100)
+                        AUTO_DL_LIMIT / n_rows * 100)
             else:
-                if len(table) > MAX_DL_LIMIT:
+                if n_rows > MAX_DL_LIMIT:
                     QMessageBox.warning(
                         self, 'Warning',
                         "Data is too big to download.\n"
-                        "Table length: {:,}. Limit {:,}".format(len(table), MAX_DL_LIMIT)
+                        "Table length: {:,}. Limit {:,}".format(n_rows, MAX_DL_LIMIT)
                     )
                     return None
                 else:
@@ -4,8 +4,10 @@
 import unittest
 from unittest import mock
 
+from AnyQt.QtWidgets import QPushButton
+
 from Orange.data import Table
-from Orange.widgets.data.owsql import OWSql
+from Orange.widgets.data.owsql import OWSql, ERROR_STYLE
 from Orange.widgets.tests.base import WidgetTest, simulate
 from Orange.tests.sql.base import DataBaseTest as dbt
 
@@ -206,6 +208,183 @@ class TestOWSql(WidgetTest):
         output = self.get_output(widget.Outputs.data, widget=widget)
         self.assertIsNone(output)
 
+    @mock.patch('Orange.widgets.data.owsql.SqlTable',
+                mock.Mock(side_effect=lambda *_, **__:
+                          mock_sqltable(None, "iris")))
+    @mock.patch('Orange.widgets.data.owsql.Backend')
+    def test_materialize(self, mocked_backends: mock.Mock):
+        backend = mock.Mock()
+        backend().display_name = "Dummy Backend"
+        backend().list_tables.return_value = ["iris", "zoo", "titanic"]
+        backend().n_tables.return_value = 3
+        backend().execute_sql_query = mock.MagicMock()
+        mocked_backends.available_backends.return_value = [backend]
+
+        settings = {"selected_backend": "Dummy Backend",
+                    "host": "host", "port": "port", "database": "DB",
+                    "schema": "", "username": "username",
+                    "password": "password", "data_source": OWSql.CUSTOM_SQL,
+                    "materialize": True, "materialize_table_name": "n"}
+        widget: OWSql = self.create_widget(OWSql, stored_settings=settings)
+        widget.sqltext.setPlainText("SELECT * FROM t -- note")
+        execute = widget.backend.execute_sql_query
+
+        with mock.patch('Orange.widgets.data.owsql.is_postgres',
+                        return_value=True):
+            execute.reset_mock()
+            widget.get_table()
+            execute.assert_called_once()
+            query = execute.call_args[0][0]
+            self.assertIn("DROP TABLE IF EXISTS n", query)
+            self.assertIn("CREATE TABLE n AS SELECT * FROM t -- note\n;", query)
+            self.assertIn("ANALYZE n", query)
+
+        with mock.patch('Orange.widgets.data.owsql.is_postgres',
+                        return_value=False):
+            execute.reset_mock()
+            widget.get_table()
+            self.assertEqual(execute.call_count, 3)
+            self.assertEqual(
+                [call[0][0] for call in execute.call_args_list],
+                ["DROP TABLE IF EXISTS n",
+                 "CREATE TABLE n AS SELECT * FROM t -- note",
+                 "ANALYZE n"])
+
+    @mock.patch('Orange.widgets.data.owsql.SqlTable',
+                side_effect=mock_sqltable)
+    @mock.patch('Orange.widgets.data.owsql.Backend')
+    def test_reuse_sql_table(self, mocked_backends: mock.Mock,
+                             mocked_sqltable: mock.Mock):
+        backend = mock.Mock()
+        backend().display_name = "Dummy Backend"
+        backend().list_tables.return_value = ["iris", "zoo", "titanic"]
+        backend().n_tables.return_value = 3
+        mocked_backends.available_backends.return_value = [backend]
+
+        settings = {"selected_backend": "Dummy Backend",
+                    "host": "host", "port": "port", "database": "DB",
+                    "schema": "", "username": "username",
+                    "password": "password"}
+        widget: OWSql = self.create_widget(OWSql, stored_settings=settings)
+        widget.tablecombo.setCurrentIndex(1)
+        widget.select_table()
+        widget.controls.guess_values.click()
+        widget.controls.guess_values.click()
+        self.assertEqual(mocked_sqltable.call_count, 1)
+        output = self.get_output(widget.Outputs.data, widget=widget)
+        self.assertEqual(len(output), 150)
+
+        # selecting a table reads it from the database again
+        widget.select_table()
+        self.assertEqual(mocked_sqltable.call_count, 2)
+
+        widget.tablecombo.setCurrentIndex(2)
+        widget.select_table()
+        self.assertEqual(mocked_sqltable.call_count, 3)
+
+        # reconnecting restores the selected table and opens it anew
+        widget.connect()
+        self.assertEqual(mocked_sqltable.call_count, 4)
+
+    @mock.patch('Orange.widgets.data.owsql.SqlTable')
+    @mock.patch('Orange.widgets.data.owsql.Backend')
+    def test_reuse_inspected_domain(self, mocked_backends: mock.Mock,
+                                    mocked_sqltable: mock.Mock):
+        get_domain = mock.Mock(return_value=Table("iris").domain)
+
+        def sqltable(*args, **_):
+            table = mock_sqltable(*args)
+            table.get_domain = get_domain
+            return table
+
+        mocked_sqltable.side_effect = sqltable
+        backend = mock.Mock()
+        backend().display_name = "Dummy Backend"
+        backend().list_tables.return_value = ["iris", "zoo", "titanic"]
+        backend().n_tables.return_value = 3
+        mocked_backends.available_backends.return_value = [backend]
+
+        settings = {"selected_backend": "Dummy Backend",
+                    "host": "host", "port": "port", "database": "DB",
+                    "schema": "", "username": "username",
+                    "password": "password"}
+        widget: OWSql = self.create_widget(OWSql, stored_settings=settings)
+        widget.tablecombo.setCurrentIndex(1)
+        widget.select_table()
+        self.assertEqual(get_domain.call_count, 1)
+
+        widget.controls.guess_values.click()
+        widget.controls.guess_values.click()
+        self.assertTrue(widget.guess_values)
+        self.assertEqual(get_domain.call_count, 1)
+        self.assertIsNotNone(self.get_output(widget.Outputs.data,
+                                             widget=widget))
+
+        # selecting a table inspects it again
+        widget.select_table()
+        self.assertEqual(get_domain.call_count, 2)
+
+        widget.connect()
+        self.assertEqual(get_domain.call_count, 3)
+
+        # so does executing a query, even an unchanged one
+        widget.controls.data_source.buttons[OWSql.CUSTOM_SQL].click()
+        widget.sqltext.setPlainText("iris")
+        widget.controls.guess_values.click()
+        widget.controls.guess_values.click()
+        self.assertEqual(get_domain.call_count, 4)
+        execute = next(button for button
+                       in widget.custom_sql.findChildren(QPushButton)
+                       if button.text() == "Execute")
+        execute.click()
+        self.assertEqual(get_domain.call_count, 5)
+
+    @mock.patch('Orange.widgets.data.owsql.LARGE_TABLE', 100)
+    @mock.patch('Orange.widgets.data.owsql.QMessageBox')
+    @mock.patch('Orange.widgets.data.owsql.SqlTable',
+                mock.Mock(side_effect=mock_sqltable))
+    @mock.patch('Orange.widgets.data.owsql.Backend')
+    def test_no_discovery_warning_for_inspected_domain(
+            self, mocked_backends: mock.Mock, msgbox: mock.Mock):
+        msgbox().addButton.return_value = "NO"
+        msgbox().clickedButton.return_value = "YES"
+        backend = mock.Mock()
+        backend().display_name = "Dummy Backend"
+        backend().list_tables.return_value = ["iris", "zoo", "titanic"]
+        backend().n_tables.return_value = 3
+        mocked_backends.available_backends.return_value = [backend]
+
+        settings = {"selected_backend": "Dummy Backend",
+                    "host": "host", "port": "port", "database": "DB",
+                    "schema": "", "username": "username",
+                    "password": "password"}
+        widget: OWSql = self.create_widget(OWSql, stored_settings=settings)
+        widget.tablecombo.setCurrentIndex(1)
+        widget.select_table()
+        self.assertEqual(msgbox().exec.call_count, 1)
+
+        widget.controls.guess_values.click()
+        widget.controls.guess_values.click()
+        self.assertTrue(widget.guess_values)
+        self.assertEqual(msgbox().exec.call_count, 1)
+
+        widget.select_table()
+        self.assertEqual(msgbox().exec.call_count, 2)
+
+    def test_highlight_error(self):
+        widget: OWSql = self.create_widget(OWSql)
+        widget.highlight_error('database "DB" does not exist')
+        self.assertEqual(widget.databasetext.styleSheet(), ERROR_STYLE)
+        self.assertEqual(widget.servertext.styleSheet(), "")
+
+        widget.highlight_error('could not translate host name "host"')
+        self.assertEqual(widget.databasetext.styleSheet(), "")
+        self.assertEqual(widget.servertext.styleSheet(), ERROR_STYLE)
+
+        widget.highlight_error("")
+        self.assertEqual(widget.databasetext.styleSheet(), "")
+        self.assertEqual(widget.servertext.styleSheet(), "")
+
 
 if __name__ == "__main__":
     unittest.main()